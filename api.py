@@ -0,0 +1,344 @@
+"""
+Read-only JSON API over the Stock Tracker store
+
+Serves packed stock per ASIN / parent, the product summary, stock value and
+low stock alerts from the shared catalog and the per-location rollups, so
+order-routing and repricing scripts don't need the Streamlit UI.
+
+Responses carry an ETag derived from the store version (modification time
+and size of the catalog, rollup and transfer inbox files); clients sending If-None-Match
+get 304 Not Modified. Encoded responses are cached per version, up to
+MAX_CACHED_BYTES.
+
+Run the server:      python api.py
+Run the benchmark:   python api.py --bench
+"""
+
+import hashlib
+import math
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from config import API_SETTINGS, LOCATIONS
+from locations import aggregate_rollups, catalog_path, inbox_path, load_rollups, rollup_path
+from storage import DECODE_ERRORS, dumps, load_store, loads
+from utils import calculate_stock_value, get_low_stock_alerts, get_product_summary
+
+# Batch requests can name any ASIN combination, so the per-version cache is capped by size
+MAX_CACHED_BYTES = 32 * 1024 * 1024
+
+class StoreSnapshot:
+    """Catalog and rollups loaded at one store version, with a response cache"""
+
+    def __init__(self, version):
+        self.version = version
+        self.etag = f'"{version}"'
+        catalog = load_store(catalog_path()) if os.path.exists(catalog_path()) else {}
+        self.parent_items = catalog.get("parent_items", {})
+        self.packet_variations = catalog.get("packet_variations", {})
+        self.rollups = load_rollups()
+        self.stock_data = aggregate_rollups(self.rollups)
+        self.parent_by_asin = {
+            asin: parent_id
+            for parent_id, variations in self.packet_variations.items()
+            for asin in variations
+        }
+        self.responses = {}
+        self.cached_bytes = 0
+        self._lock = threading.Lock()
+
+    def stock_for_asin(self, asin, location=None):
+        parent_id = self.parent_by_asin.get(asin)
+        if parent_id is None:
+            return None
+
+        by_location = {}
+        for loc, rollup in self.rollups.items():
+            if location and loc != location:
+                continue
+            by_location[loc] = rollup.get(parent_id, {}).get("packed_stock", {}).get(asin, 0)
+
+        return {
+            "parent_id": parent_id,
+            "description": self.packet_variations[parent_id][asin].get("description", asin),
+            "packed_units": sum(by_location.values()),
+            "by_location": by_location
+        }
+
+    def stock_for_parent(self, parent_id, location=None):
+        if parent_id not in self.parent_items:
+            return None
+
+        by_location = {}
+        for loc, rollup in self.rollups.items():
+            if location and loc != location:
+                continue
+            stock = rollup.get(parent_id, {})
+            by_location[loc] = {
+                "loose_stock": stock.get("loose_stock", 0),
+                "packed_stock": stock.get("packed_stock", {})
+            }
+
+        packed = {}
+        for stock in by_location.values():
+            for asin, units in stock["packed_stock"].items():
+                packed[asin] = packed.get(asin, 0) + units
+
+        return {
+            "parent_id": parent_id,
+            "name": self.parent_items[parent_id]["name"],
+            "loose_stock": sum(stock["loose_stock"] for stock in by_location.values()),
+            "packed_stock": packed,
+            "by_location": by_location
+        }
+
+    def stock_data_for(self, location=None):
+        if location:
+            return self.rollups.get(location, {})
+        return self.stock_data
+
+    def cached(self, key, build):
+        """Return the encoded response for key, building it once per version"""
+        body = self.responses.get(key)
+        if body is None:
+            body = dumps(build())
+            with self._lock:
+                if key not in self.responses and self.cached_bytes + len(body) <= MAX_CACHED_BYTES:
+                    self.responses[key] = body
+                    self.cached_bytes += len(body)
+        return body
+
+class Store:
+    """Tracks the store version and reloads the snapshot when it changes"""
+
+    def __init__(self, refresh_interval=1.0):
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        parts = []
+        paths = [catalog_path()]
+        for location in LOCATIONS:
+            paths += [rollup_path(location), inbox_path(location)]
+        for path in paths:
+            try:
+                info = os.stat(path)
+                parts.append(f"{path}:{info.st_mtime_ns}:{info.st_size}")
+            except FileNotFoundError:
+                parts.append(f"{path}:-")
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+    def snapshot(self):
+        """Current snapshot; the files are stat'ed at most once per refresh_interval"""
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._checked_at < self.refresh_interval:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and now - self._checked_at < self.refresh_interval:
+                return self._snapshot
+            version = self.current_version()
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = StoreSnapshot(version)
+            self._checked_at = now
+            return self._snapshot
+
+class APIHandler(BaseHTTPRequestHandler):
+    """Routes GET/POST requests to the read-only endpoints"""
+
+    protocol_version = "HTTP/1.1"
+    # Buffer headers and body into one send; unbuffered writes stall on Nagle + delayed ACK
+    wbufsize = 64 * 1024
+    store = None
+
+    def log_message(self, format, *args):
+        if API_SETTINGS.get("access_log"):
+            super().log_message(format, *args)
+
+    def _send(self, status, body=b"", etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, dumps({"error": message}))
+
+    def _respond(self, snapshot, key, build):
+        if self.headers.get("If-None-Match") == snapshot.etag:
+            self._send(304, etag=snapshot.etag)
+            return
+        self._send(200, snapshot.cached(key, build), etag=snapshot.etag)
+
+    def _batch(self, snapshot, asins, location):
+        limit = API_SETTINGS.get("max_batch_asins", 1000)
+        if not asins:
+            return self._error(400, "No ASINs given")
+        if len(asins) > limit:
+            return self._error(400, f"At most {limit} ASINs per request")
+        key = ("stock", location, tuple(asins))
+        self._respond(snapshot, key, lambda: {
+            "version": snapshot.version,
+            "items": {asin: snapshot.stock_for_asin(asin, location) for asin in asins}
+        })
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        location = query.get("location", [None])[0]
+        if location and location not in LOCATIONS:
+            return self._error(404, f"Unknown location: {location}")
+
+        snapshot = self.store.snapshot()
+        path = url.path.rstrip("/")
+
+        if path == "/health":
+            self._send(200, dumps({"status": "ok", "version": snapshot.version}))
+        elif path == "/stock":
+            asins = [asin for value in query.get("asin", []) for asin in value.split(",") if asin]
+            self._batch(snapshot, asins, location)
+        elif path.startswith("/stock/parent/"):
+            # IDs are built from product names, so clients percent-encode them
+            parent_id = unquote(path[len("/stock/parent/"):])
+            result = snapshot.stock_for_parent(parent_id, location)
+            if result is None:
+                return self._error(404, f"Unknown product: {parent_id}")
+            self._respond(snapshot, ("parent", location, parent_id), lambda: dict(result, version=snapshot.version))
+        elif path == "/summary":
+            self._respond(snapshot, ("summary", location), lambda: {
+                "version": snapshot.version,
+                "products": get_product_summary(snapshot.stock_data_for(location), snapshot.parent_items, snapshot.packet_variations)
+            })
+        elif path == "/value":
+            self._respond(snapshot, ("value", location), lambda: {
+                "version": snapshot.version,
+                "stock_value": calculate_stock_value(snapshot.stock_data_for(location), snapshot.parent_items, snapshot.packet_variations)
+            })
+        elif path == "/alerts":
+            try:
+                threshold = float(query.get("threshold", [10])[0])
+            except ValueError:
+                return self._error(400, "threshold must be a number")
+            if not math.isfinite(threshold):
+                return self._error(400, "threshold must be a finite number")
+            self._respond(snapshot, ("alerts", location, threshold), lambda: {
+                "version": snapshot.version,
+                "alerts": get_low_stock_alerts(snapshot.stock_data_for(location), snapshot.parent_items, snapshot.packet_variations, threshold)
+            })
+        else:
+            self._error(404, "Not found")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/stock/batch":
+            return self._error(404, "Not found")
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0 or length > API_SETTINGS.get("max_body_bytes", 1024 * 1024):
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            if length < 0:
+                return self._error(400, "Invalid Content-Length")
+            return self._error(413, "Request body too large")
+
+        try:
+            payload = loads(self.rfile.read(length)) if length else {}
+        except DECODE_ERRORS:
+            return self._error(400, "Body must be JSON")
+        if not isinstance(payload, dict):
+            return self._error(400, "Body must be a JSON object")
+
+        location = payload.get("location")
+        if location is not None and not isinstance(location, str):
+            return self._error(400, "'location' must be a string")
+        if location and location not in LOCATIONS:
+            return self._error(404, f"Unknown location: {location}")
+        asins = payload.get("asins", [])
+        if not isinstance(asins, list):
+            return self._error(400, "'asins' must be a list")
+        self._batch(self.store.snapshot(), [str(asin) for asin in asins], location)
+
+def create_server(host=None, port=None):
+    """Create (but do not start) the API server"""
+    handler = type("Handler", (APIHandler,), {"store": Store(API_SETTINGS.get("refresh_interval", 1.0))})
+    server = ThreadingHTTPServer((host or API_SETTINGS["host"], port if port is not None else API_SETTINGS["port"]), handler)
+    server.daemon_threads = True
+    return server
+
+def run_benchmark(requests_per_client=2000, clients=8):
+    """Measure request rate against a local server on a free port"""
+    import http.client
+
+    server = create_server(port=0)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    snapshot = server.RequestHandlerClass.store.snapshot()
+    asins = list(snapshot.parent_by_asin)[:50] or ["UNKNOWN"]
+    targets = {
+        "single ASIN": f"/stock?asin={asins[0]}",
+        f"batch of {len(asins)} ASINs": "/stock?asin=" + ",".join(asins),
+        "summary": "/summary",
+        "summary (ETag revalidation)": "/summary"
+    }
+
+    results = {}
+    for name, target in targets.items():
+        revalidate = "ETag" in name
+        latencies = []
+        lock = threading.Lock()
+
+        def client():
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            headers = {"If-None-Match": snapshot.etag} if revalidate else {}
+            local = []
+            for _ in range(requests_per_client):
+                started = time.perf_counter()
+                conn.request("GET", target, headers=headers)
+                conn.getresponse().read()
+                local.append(time.perf_counter() - started)
+            conn.close()
+            with lock:
+                latencies.extend(local)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        results[name] = {
+            "requests_per_second": len(latencies) / elapsed,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000
+        }
+
+    server.shutdown()
+    return results
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        for name, result in run_benchmark().items():
+            print(f"{name:32} {result['requests_per_second']:10.0f} req/s   "
+                  f"p50 {result['p50_ms']:.2f} ms   p99 {result['p99_ms']:.2f} ms")
+    else:
+        server = create_server()
+        print(f"Serving stock API on http://{server.server_address[0]}:{server.server_address[1]}")
+        server.serve_forever()
@@ -8,6 +8,17 @@ import json
 import os
 from utils import *
 from config import *
+from storage import save_store, load_store
+from persistence import get_writer
+from sheets_sync import get_syncer
+from ingestion import ingest_folder, apply_sales_batch, load_fingerprints, save_fingerprints, save_retry_rows
+from order_index import backfill_order_ids, build_order_index, find_duplicate, get_order_index, transaction_ref
+from records import TransactionLog
+from locations import (
+    shards_folder, catalog_path, shard_path, rollup_path, order_index_path, load_shard, compute_rollup, build_rollup,
+    load_rollups, aggregate_rollups, migrate_legacy_file, read_inbox, post_transfer, prune_inbox,
+    apply_transfer_entries
+)
 
 # Configure page
 st.set_page_config(
@@ -17,7 +28,7 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Data persistence
+# Data persistence (single-file store from before locations; migrated into shards on first load)
 DATA_FILE = "stock_data.json"
 
 def initialize_sample_data():
@@ -59,48 +70,179 @@ def initialize_sample_data():
         for asin in st.session_state.packet_variations.get(parent_id, {}):
             st.session_state.stock_data[parent_id]["packed_stock"][asin] = 0
     
-    st.session_state.transactions = []
+    st.session_state.transactions = TransactionLog()
+    st.session_state.inbox_seq = 0
+
+def persist(path, data, after=()):
+    """Write data to path through the write-behind writer or directly
+
+    after lists files whose pending writes must reach disk before this one.
+    """
+    if DEFAULT_SETTINGS.get("write_behind"):
+        # Encoded here, written by the background writer
+        get_writer(path).submit(data, after=[get_writer(dependency) for dependency in after])
+    else:
+        save_store(path, data)
+
+def flush_pending(path):
+    """Wait for queued writes to path so a load sees them; False if a write failed"""
+    if not DEFAULT_SETTINGS.get("write_behind"):
+        return True
+    
+    writer = get_writer(path)
+    if writer.flush():
+        return True
+    
+    error = writer.get_stats()["last_error"] or "write did not complete"
+    st.error(f"❌ Saving {path} failed ({error}). The data loaded from disk may be out of date.")
+    return False
+
+def get_orders():
+    """Network-wide order index shared by every session in this process"""
+    return get_order_index(order_index_path())
+
+def save_orders():
+    """Save the network-wide order index"""
+    orders = get_orders()
+    with orders.lock:
+        # Index entries must never land without the sales they point at, at any location
+        persist(order_index_path(), orders.to_dict(), after=[shard_path(location) for location in LOCATIONS])
+
+def saving_blocked():
+    """True (after showing why) when the last load failed and session data must not be saved"""
+    if st.session_state.get("load_error"):
+        st.error(f"❌ Not saved: data failed to load ({st.session_state.load_error})")
+        return True
+    return False
+
+def save_catalog():
+    """Save the shared product catalog"""
+    if saving_blocked():
+        return
+    persist(catalog_path(), {
+        "parent_items": st.session_state.parent_items,
+        "packet_variations": st.session_state.packet_variations,
+        "last_updated": datetime.datetime.now().isoformat()
+    })
 
 def save_data():
-    """Save data to JSON file"""
+    """Save the current location's shard and its stock rollup"""
+    if saving_blocked():
+        return
+    merge_transfer_inbox()
+    
+    location = st.session_state.location
     data = {
+        "location": location,
         "stock_data": st.session_state.stock_data,
-        "transactions": st.session_state.transactions,
-        "parent_items": st.session_state.parent_items,
-        "packet_variations": st.session_state.packet_variations,
+        "transactions": st.session_state.transactions.to_transactions(),
         "daily_opening_stock": getattr(st.session_state, 'daily_opening_stock', {}),
+        "order_ids_backfilled": True,
+        "inbox_seq": st.session_state.inbox_seq,
         "last_updated": datetime.datetime.now().isoformat()
     }
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    persist(shard_path(location), data)
+    persist(rollup_path(location), build_rollup(st.session_state.stock_data, st.session_state.inbox_seq), after=[shard_path(location)])
+    
+    if DEFAULT_SETTINGS.get("sync_to_sheets"):
+        get_syncer(location).request_sync(dict(data, parent_items=st.session_state.parent_items))
 
-def load_data():
-    """Load data from JSON file"""
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-                st.session_state.stock_data = data.get("stock_data", {})
-                st.session_state.transactions = data.get("transactions", [])
-                st.session_state.parent_items = data.get("parent_items", {})
-                st.session_state.packet_variations = data.get("packet_variations", {})
-                st.session_state.daily_opening_stock = data.get("daily_opening_stock", {})
-        except Exception as e:
-            st.error(f"Error loading data: {e}")
-            initialize_sample_data()
-    else:
-        initialize_sample_data()
+def merge_transfer_inbox():
+    """Apply transfers posted to this location since the shard was saved; returns the count"""
+    entries = [entry for entry in read_inbox(st.session_state.location) if entry["seq"] > st.session_state.inbox_seq]
+    
+    # Products added at another location since this session loaded the catalog
+    if any(entry["parent_id"] not in st.session_state.parent_items for entry in entries):
+        load_catalog()
+    
+    merged = 0
+    for entry in entries:
+        if entry["parent_id"] not in st.session_state.parent_items:
+            # Left pending (with everything after it, to keep the watermark exact) until the product exists
+            st.warning(f"⚠️ Transfer {entry['transfer_id']} is for an unknown product ({entry['parent_id']}) and was not received yet")
+            break
+        
+        # Recorded before the stock changes, so a failure leaves nothing half-applied
+        record_transaction(
+            "Transfer In", entry["parent_id"], entry.get("asin"), entry["quantity"], entry["weight"],
+            notes=entry.get("notes", ""),
+            transfer_id=entry["transfer_id"],
+            transaction_date=datetime.date.fromisoformat(entry["date"]),
+            save=False
+        )
+        apply_transfer_entries(st.session_state.stock_data, [entry])
+        st.session_state.inbox_seq = entry["seq"]
+        merged += 1
+    
+    return merged
 
-# Initialize session state
-if 'initialized' not in st.session_state:
-    st.session_state.initialized = False
+def load_catalog():
+    """Load the shared product catalog and add stock rows for products new to this location"""
+    flush_pending(catalog_path())
+    catalog = load_store(catalog_path())
+    st.session_state.parent_items = catalog.get("parent_items", {})
+    st.session_state.packet_variations = catalog.get("packet_variations", {})
+    add_missing_stock_rows()
 
-if not st.session_state.initialized:
-    load_data()
-    st.session_state.initialized = True
+def add_missing_stock_rows():
+    """Zeroed stock rows for catalog products this location has not stocked yet"""
+    for parent_id in st.session_state.parent_items:
+        stock = st.session_state.stock_data.setdefault(parent_id, {"loose_stock": 0, "packed_stock": {}, "opening_stock": 0})
+        for asin in st.session_state.packet_variations.get(parent_id, {}):
+            stock["packed_stock"].setdefault(asin, 0)
+
+def load_data(location=None):
+    """Load the product catalog and one location's shard"""
+    location = location or getattr(st.session_state, 'location', DEFAULT_LOCATION)
+    st.session_state.location = location
+    st.session_state.load_error = None
+    
+    try:
+        os.makedirs(shards_folder(), exist_ok=True)
+        migrate_legacy_file(DATA_FILE, DEFAULT_LOCATION)
+        
+        flush_pending(catalog_path())
+        if os.path.exists(catalog_path()):
+            catalog = load_store(catalog_path())
+            st.session_state.parent_items = catalog.get("parent_items", {})
+            st.session_state.packet_variations = catalog.get("packet_variations", {})
+        else:
+            initialize_sample_data()
+            save_catalog()
+        
+        flush_pending(shard_path(location))
+        shard = load_shard(location, st.session_state.parent_items, st.session_state.packet_variations)
+        st.session_state.stock_data = shard.get("stock_data", {})
+        transactions = shard.get("transactions", [])
+        st.session_state.daily_opening_stock = shard.get("daily_opening_stock", {})
+        st.session_state.inbox_seq = shard.get("inbox_seq", 0)
+        
+        # Entries at or below the saved watermark are already in the shard and rollup on disk
+        flush_pending(rollup_path(location))
+        prune_inbox(location, st.session_state.inbox_seq)
+        
+        # Products added at another location have no stock row here yet
+        add_missing_stock_rows()
+        
+        if not shard.get("order_ids_backfilled", "order_index" in shard):
+            # Older files only have order IDs inside sale notes
+            backfill_order_ids(transactions)
+        
+        # Also covers per-shard indexes from older files and sales whose index write was lost
+        if get_orders().merge(build_order_index(transactions), location):
+            save_orders()
+        
+        # Kept as compact records in memory; converted back to dicts only when saving
+        st.session_state.transactions = TransactionLog.from_transactions(transactions)
+        
+        if merge_transfer_inbox():
+            save_data()
+    except Exception as e:
+        # Never substitute sample data here: the next save would overwrite the real files
+        st.session_state.load_error = f"{LOCATIONS.get(location, location)}: {e}"
 
-def record_transaction(transaction_type, parent_id, asin=None, quantity=0, weight=0, notes="", batch_id=None, transaction_date=None):
-    """Record a transaction and return transaction ID"""
+def record_transaction(transaction_type, parent_id, asin=None, quantity=0, weight=0, notes="", batch_id=None, transaction_date=None, order_id=None, transfer_id=None, save=True):
+    """Record a transaction and return transaction ID (pass save=False when batching)"""
     transaction_id = len(st.session_state.transactions) + 1
     
     # Use provided date or default to today
@@ -117,25 +259,63 @@ def record_transaction(transaction_type, parent_id, asin=None, quantity=0, weigh
         "asin": asin,
         "quantity": quantity,
         "weight": weight,
-        "notes": notes
+        "notes": notes,
+        "location": st.session_state.location
     }
     
     # Add batch information if provided
     if batch_id:
         transaction["batch_id"] = batch_id
     
+    if transfer_id:
+        transaction["transfer_id"] = transfer_id
+    
+    if order_id:
+        transaction["order_id"] = order_id
+        get_orders().reserve(order_id, asin, transaction_ref(st.session_state.location, transaction_id))
+    
     st.session_state.transactions.append(transaction)
-    save_data()
+    if save:
+        save_data()
+        if order_id:
+            save_orders()
     return transaction_id
 
+# Initialize session state (after record_transaction, which merging transfers on load needs)
+if 'initialized' not in st.session_state:
+    st.session_state.initialized = False
+
+if not st.session_state.initialized:
+    load_data()
+    st.session_state.initialized = True
+
 def main():
     st.title("Stock Tracker - Mithila Foods")
     
     # Sidebar navigation
     st.sidebar.title("Navigation")
+    location = st.sidebar.selectbox(
+        "Location",
+        options=list(LOCATIONS.keys()),
+        index=list(LOCATIONS.keys()).index(st.session_state.location),
+        format_func=lambda x: LOCATIONS[x]
+    )
+    if location != st.session_state.location:
+        load_data(location)
+    elif not st.session_state.load_error and merge_transfer_inbox():
+        save_data()
+    
+    if st.session_state.load_error:
+        st.error(f"❌ Error loading data for {st.session_state.load_error}")
+        st.info("Nothing is saved until the data loads. Fix or restore the file, then retry.")
+        if st.button("Retry Loading"):
+            load_data(location)
+            st.rerun()
+        return
+    
     page = st.sidebar.selectbox(
         "Select Page",
-        ["Dashboard", "Stock Inward", "Packing Operations", "Sales Management", "Products Management"]
+        ["Dashboard", "Stock Inward", "Packing Operations", "Sales Management", "Stock Transfer", "Products Management"]
     )
     
     if page == "Dashboard":
@@ -146,12 +326,30 @@ def main():
         show_packing_operations()
     elif page == "Sales Management":
         show_sales_management()
+    elif page == "Stock Transfer":
+        show_stock_transfer()
     elif page == "Products Management":
         show_products_management()
+    
+    if DEFAULT_SETTINGS.get("write_behind"):
+        show_storage_status()
+
+def show_storage_status():
+    """Sidebar panel with write-behind queue figures"""
+    stats = get_writer(shard_path(st.session_state.location)).get_stats()
+    
+    with st.sidebar.expander("💾 Storage Status"):
+        st.write(f"**Queue depth:** {stats['queue_depth']}")
+        st.write(f"**Pending writes:** {stats['pending_writes']}")
+        st.write(f"**Disk writes:** {stats['flush_count']} ({stats['coalesced_writes']} coalesced)")
+        st.write(f"**Last flush latency:** {stats['last_flush_latency_ms']:.1f} ms")
+    
+    if stats['last_error']:
+        st.sidebar.error(f"Error saving data: {stats['last_error']}")
 
 def show_dashboard():
     """Display main dashboard"""
-    st.header("📊 Stock Dashboard")
+    st.header(f"📊 Stock Dashboard - {LOCATIONS[st.session_state.location]}")
     
     # Quick stats
     col1, col2, col3, col4 = st.columns(4)
@@ -214,6 +412,33 @@ def show_dashboard():
                     st.warning(f"**{alert['type']}:** {alert['product']} - Current: {alert['current_stock']} {alert['unit']}")
     else:
         st.info("No stock data available.")
+    
+    show_network_overview()
+
+def show_network_overview():
+    """Stock across all locations, built from per-location rollups"""
+    st.subheader("🏬 All Locations")
+    
+    rollups = load_rollups()
+    # This session's own figures may not have reached disk yet
+    rollups[st.session_state.location] = compute_rollup(st.session_state.stock_data)
+    
+    location_rows = []
+    for location, rollup in rollups.items():
+        location_rows.append({
+            "Location": LOCATIONS.get(location, location),
+            "Loose Stock (kg)": sum(stock.get("loose_stock", 0) for stock in rollup.values()),
+            "Packed Units": sum(sum(stock.get("packed_stock", {}).values()) for stock in rollup.values()),
+            "Stock Value": format_currency(calculate_stock_value(rollup, st.session_state.parent_items, st.session_state.packet_variations))
+        })
+    st.dataframe(pd.DataFrame(location_rows), use_container_width=True)
+    
+    summary = get_product_summary(aggregate_rollups(rollups), st.session_state.parent_items, st.session_state.packet_variations)
+    if summary:
+        df_network = pd.DataFrame(summary)
+        df_network = df_network[['product_name', 'category', 'loose_stock', 'packed_units', 'packed_weight', 'total_weight']]
+        df_network.columns = ['Product', 'Category', 'Loose Stock (kg)', 'Packed Units', 'Packed Weight (kg)', 'Total Weight (kg)']
+        st.dataframe(df_network, use_container_width=True)
 
 def show_stock_inward():
     """Stock inward entry"""
@@ -359,7 +584,7 @@ def show_sales_management():
     """Sales management"""
     st.header("🛒 Sales Management")
     
-    tab1, tab2 = st.tabs(["📝 Manual Sale", "📊 Sales Analytics"])
+    tab1, tab2, tab3 = st.tabs(["📝 Manual Sale", "📊 Sales Analytics", "📁 Bulk Import"])
     
     with tab1:
         st.subheader("Record Sale")
@@ -416,33 +641,41 @@ def show_sales_management():
                     submitted = st.form_submit_button("Record Sale")
                     
                     if submitted:
-                        if available_units >= quantity_sold:
-                            # Update stock
-                            st.session_state.stock_data[parent_id]["packed_stock"][asin] -= quantity_sold
-                            st.session_state.stock_data[parent_id]["last_updated"] = datetime.datetime.now().isoformat()
-                            
-                            # Record transaction
-                            weight_sold = quantity_sold * st.session_state.packet_variations[parent_id][asin]["weight"]
-                            transaction_notes = f"{sale_type}"
-                            if order_id:
-                                transaction_notes += f" | Order: {order_id}"
-                            if notes:
-                                transaction_notes += f" | {notes}"
-                            
-                            transaction_id = record_transaction(
-                                transaction_type=sale_type,
-                                parent_id=parent_id,
-                                asin=asin,
-                                quantity=quantity_sold,
-                                weight=weight_sold,
-                                notes=transaction_notes,
-                                transaction_date=sale_date
-                            )
-                            
-                            st.success(f"✅ Sale recorded successfully! {quantity_sold} units of {format_product_option(asin)}")
-                            st.rerun()
-                        else:
-                            st.error(f"❌ Insufficient stock! Available: {available_units}, Requested: {quantity_sold}")
+                        order_id = order_id.strip()
+                        orders = get_orders()
+                        # Held until the sale is recorded, so another location cannot record the same order line
+                        with orders.lock:
+                            duplicate_id = find_duplicate(orders, order_id, asin)
+                            if duplicate_id is not None:
+                                st.error(f"❌ Order {order_id} was already recorded for this product ({duplicate_id})")
+                            elif available_units >= quantity_sold:
+                                # Update stock
+                                st.session_state.stock_data[parent_id]["packed_stock"][asin] -= quantity_sold
+                                st.session_state.stock_data[parent_id]["last_updated"] = datetime.datetime.now().isoformat()
+                                
+                                # Record transaction
+                                weight_sold = quantity_sold * st.session_state.packet_variations[parent_id][asin]["weight"]
+                                transaction_notes = f"{sale_type}"
+                                if order_id:
+                                    transaction_notes += f" | Order: {order_id}"
+                                if notes:
+                                    transaction_notes += f" | {notes}"
+                                
+                                transaction_id = record_transaction(
+                                    transaction_type=sale_type,
+                                    parent_id=parent_id,
+                                    asin=asin,
+                                    quantity=quantity_sold,
+                                    weight=weight_sold,
+                                    notes=transaction_notes,
+                                    transaction_date=sale_date,
+                                    order_id=order_id or None
+                                )
+                                
+                                st.success(f"✅ Sale recorded successfully! {quantity_sold} units of {format_product_option(asin)}")
+                                st.rerun()
+                            else:
+                                st.error(f"❌ Insufficient stock! Available: {available_units}, Requested: {quantity_sold}")
             else:
                 st.info("Please select a product variation to continue")
         else:
@@ -486,6 +719,149 @@ def show_sales_management():
                 st.info("No sales transactions recorded yet.")
         else:
             st.info("No transactions recorded yet.")
+    
+    with tab3:
+        show_bulk_import()
+
+def show_bulk_import():
+    """Import every new sales report in the uploads folder as one batch"""
+    st.subheader("Bulk Import from Uploads Folder")
+    
+    folder = FILE_PATHS["uploads_folder"]
+    st.write(f"Place daily marketplace reports (.xlsx, .xls, .csv) in `{folder}`. Files already imported are skipped.")
+    
+    if st.button("Import Folder"):
+        with st.spinner("Parsing report files..."):
+            result = ingest_folder(folder)
+        
+        if not result["rows"] and not result["errors"]:
+            st.info("No new report files or pending rows found.")
+            return
+        
+        orders = get_orders()
+        # Held until the batch is saved, so another location cannot record the same order lines
+        with orders.lock:
+            applied, skipped = apply_sales_batch(
+                st.session_state.stock_data,
+                st.session_state.packet_variations,
+                result["rows"],
+                orders
+            )
+            
+            batch_id = f"IMPORT-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+            for row in applied:
+                notes = f"{row['type']} | Source: {row['source']}"
+                if row.get("order_id"):
+                    notes += f" | Order: {row['order_id']}"
+                record_transaction(
+                    transaction_type=row["type"],
+                    parent_id=row["parent_id"],
+                    asin=row["asin"],
+                    quantity=row["quantity"],
+                    weight=row["weight"],
+                    notes=notes,
+                    batch_id=batch_id,
+                    transaction_date=datetime.date.fromisoformat(row["date"]) if row["date"] else None,
+                    order_id=row.get("order_id"),
+                    save=False
+                )
+            save_data()
+            save_orders()
+        
+        # Files are only marked as imported once the sales they produced are on disk
+        if not (flush_pending(shard_path(st.session_state.location)) and flush_pending(order_index_path())):
+            st.error("❌ The imported sales could not be saved, so the files were not marked as imported. Import the folder again.")
+            return
+        
+        # Rows that could not be applied yet are kept for the next import
+        fingerprints = load_fingerprints(folder)
+        fingerprints.update(result["fingerprints"])
+        save_fingerprints(folder, fingerprints)
+        kept_for_retry = save_retry_rows(folder, skipped)
+        
+        st.success(f"✅ Imported {len(applied)} sales from {len(result['files'])} files "
+                   f"({result['duplicates']} duplicate order lines dropped)")
+        if skipped:
+            st.warning(f"Skipped {len(skipped)} rows ({kept_for_retry} kept and retried on the next import)")
+            st.dataframe(pd.DataFrame(skipped), use_container_width=True)
+        for name, error in result["errors"].items():
+            st.error(f"❌ {name}: {error}")
+
+def show_stock_transfer():
+    """Move loose or packed stock from this location to another"""
+    st.header("🚚 Stock Transfer")
+    
+    source = st.session_state.location
+    destinations = [loc for loc in LOCATIONS if loc != source]
+    
+    parent_id = st.selectbox(
+        "Select Product",
+        options=list(st.session_state.parent_items.keys()),
+        format_func=lambda x: st.session_state.parent_items[x]["name"]
+    )
+    if not parent_id:
+        return
+    
+    variations = st.session_state.packet_variations.get(parent_id, {})
+    stock = st.session_state.stock_data.get(parent_id, {})
+    
+    with st.form("transfer_form"):
+        destination = st.selectbox("Transfer To", destinations, format_func=lambda x: LOCATIONS[x])
+        asin = st.selectbox(
+            "Stock",
+            options=[None] + list(variations.keys()),
+            format_func=lambda x: f"Loose stock ({stock.get('loose_stock', 0)} kg)" if x is None
+                else f"{variations[x].get('description', x)} ({stock.get('packed_stock', {}).get(x, 0)} units)"
+        )
+        amount = st.number_input("Quantity (units for packed stock, kg for loose stock)", min_value=0.0, step=1.0)
+        notes = st.text_area("Notes (optional)")
+        
+        submitted = st.form_submit_button("Transfer Stock")
+        
+        if submitted and amount > 0:
+            if asin:
+                quantity = int(amount)
+                weight = quantity * variations[asin].get("weight", 0)
+                available = stock.get("packed_stock", {}).get(asin, 0)
+                enough = quantity > 0 and available >= quantity
+            else:
+                quantity = 0
+                weight = amount
+                available = stock.get("loose_stock", 0)
+                enough = available >= weight
+            
+            if not enough:
+                st.error(f"❌ Insufficient stock! Available: {available}, Requested: {amount}")
+                return
+            
+            transfer_id = f"TRF-{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+            
+            # Post to the destination's inbox first, so a failure leaves the source untouched;
+            # the destination session merges it, so its own saves never drop the stock
+            post_transfer(destination, {
+                "date": datetime.date.today().isoformat(),
+                "parent_id": parent_id,
+                "asin": asin,
+                "quantity": quantity,
+                "weight": weight,
+                "notes": f"From: {LOCATIONS[source]}" + (f" | {notes}" if notes else ""),
+                "transfer_id": transfer_id
+            })
+            
+            if asin:
+                st.session_state.stock_data[parent_id]["packed_stock"][asin] -= quantity
+            else:
+                st.session_state.stock_data[parent_id]["loose_stock"] -= weight
+            st.session_state.stock_data[parent_id]["last_updated"] = datetime.datetime.now().isoformat()
+            
+            record_transaction(
+                "Transfer Out", parent_id, asin, quantity, weight,
+                notes=f"To: {LOCATIONS[destination]}" + (f" | {notes}" if notes else ""),
+                transfer_id=transfer_id
+            )
+            
+            st.success(f"✅ Transferred to {LOCATIONS[destination]} ({transfer_id})")
+            st.rerun()
 
 def show_products_management():
     """Products management"""
@@ -567,6 +943,7 @@ def show_products_management():
                     "last_updated": datetime.datetime.now().isoformat()
                 }
                 
+                save_catalog()
                 save_data()
                 st.success(f"✅ Product '{product_name}' added successfully!")
                 st.rerun()
@@ -9,6 +9,7 @@ APP_CONFIG = {
 # Default settings
 DEFAULT_SETTINGS = {
     "auto_save": True,
+    "write_behind": True,
     "backup_frequency": "daily",
     "data_retention_days": 365,
     "sync_to_sheets": False,
@@ -53,13 +54,55 @@ TRANSACTION_TYPES = [
     "Easy Ship Sale (Bulk)",
     "Stock Adjustment",
     "Damage/Loss",
-    "Return"
+    "Return",
+    "Transfer Out",
+    "Transfer In"
 ]
 
+# Stock locations; each one is stored in its own shard file
+LOCATIONS = {
+    "WAREHOUSE": "Own Warehouse",
+    "FBA_BLR8": "FBA Bengaluru (BLR8)",
+    "FBA_BOM5": "FBA Mumbai (BOM5)",
+    "FBA_DEL4": "FBA Delhi (DEL4)"
+}
+DEFAULT_LOCATION = "WAREHOUSE"
+
 # File paths
 FILE_PATHS = {
     "data_file": "stock_data.json",
     "backup_folder": "backups",
     "uploads_folder": "uploads",
-    "exports_folder": "exports"
+    "exports_folder": "exports",
+    "shards_folder": "shards",
+    "sync_state": "sheets_sync_state.json"
+}
+
+# Column names accepted in marketplace sales reports (see find_column)
+REPORT_COLUMNS = {
+    "order_id": ["amazon-order-id", "Order ID", "order-id", "order_id", "Order Id"],
+    "asin": ["asin", "ASIN", "Asin"],
+    "quantity": ["quantity", "Quantity", "quantity-shipped", "Qty", "Units"],
+    "date": ["purchase-date", "Date", "date", "Order Date", "shipment-date"]
+}
+
+# Read-only JSON API (api.py)
+API_SETTINGS = {
+    "host": "127.0.0.1",
+    "port": 8502,
+    "refresh_interval": 1.0,
+    "max_batch_asins": 1000,
+    "max_body_bytes": 1024 * 1024,
+    "access_log": False
+}
+
+# Google Sheets sync (used when DEFAULT_SETTINGS["sync_to_sheets"] is on).
+# Without a spreadsheet_key, worksheets are written as JSON files to local_folder.
+SHEETS_SYNC = {
+    "spreadsheet_key": "",
+    "credentials_file": "google_credentials.json",
+    "local_folder": "sheets_local",
+    "batch_size": 500,
+    "max_retries": 5,
+    "backoff_seconds": 1.0
 }
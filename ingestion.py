@@ -0,0 +1,236 @@
+"""
+Bulk sales report ingestion for the Stock Tracker application
+
+Parses every report file in the uploads folder across a process pool,
+merges the rows, drops duplicate order lines and returns one batch for the
+app to apply. Files whose content fingerprint was already imported are
+skipped; rows that could not be applied (unknown ASIN, not enough stock)
+are kept in a retry file and included in the next import.
+"""
+
+import datetime
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from config import FILE_PATHS, REPORT_COLUMNS
+from order_index import find_duplicate
+from storage import dumps, loads, write_atomic
+from utils import clean_excel_data, find_column
+
+REPORT_EXTENSIONS = (".xlsx", ".xls", ".csv")
+FINGERPRINT_FILE = ".ingested.json"
+RETRY_FILE = ".retry.json"
+
+def file_fingerprint(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def detect_channel(filename):
+    """Work out the sale type from a report file name"""
+    name = filename.lower()
+    if "easy" in name:
+        return "Easy Ship Sale (Bulk)"
+    return "FBA Sale (Bulk)"
+
+def parse_report_file(path):
+    """Parse one report file into sale rows (runs in a worker process)"""
+    try:
+        if path.lower().endswith(".csv"):
+            df = pd.read_csv(path)
+        else:
+            df = pd.read_excel(path)
+    except Exception as e:
+        return path, [], f"Could not read file: {e}"
+
+    df = clean_excel_data(df)
+
+    columns = {field: find_column(df, names) for field, names in REPORT_COLUMNS.items()}
+    if not columns["asin"]:
+        return path, [], "No ASIN column found"
+
+    channel = detect_channel(os.path.basename(path))
+    rows = []
+    for record in df.to_dict("records"):
+        asin = record.get(columns["asin"])
+        if pd.isna(asin) or not str(asin).strip():
+            continue
+
+        quantity = 1
+        if columns["quantity"]:
+            try:
+                quantity = int(float(record.get(columns["quantity"])))
+            except (TypeError, ValueError):
+                continue
+        if quantity <= 0:
+            continue
+
+        order_id = record.get(columns["order_id"]) if columns["order_id"] else None
+        order_id = None if order_id is None or pd.isna(order_id) else str(order_id).strip()
+
+        sale_date = None
+        if columns["date"]:
+            parsed = pd.to_datetime(record.get(columns["date"]), errors="coerce")
+            if not pd.isna(parsed):
+                sale_date = parsed.date().isoformat()
+
+        rows.append({
+            "order_id": order_id,
+            "asin": str(asin).strip(),
+            "quantity": quantity,
+            "date": sale_date,
+            "type": channel,
+            "source": os.path.basename(path)
+        })
+
+    return path, rows, None
+
+def load_fingerprints(folder):
+    """Fingerprints of files already imported from folder"""
+    path = os.path.join(folder, FINGERPRINT_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+def save_fingerprints(folder, fingerprints):
+    """Persist the fingerprint cache for folder"""
+    write_atomic(os.path.join(folder, FINGERPRINT_FILE), dumps(fingerprints))
+
+def load_retry_rows(folder):
+    """Rows from earlier imports that still need to be applied"""
+    path = os.path.join(folder, RETRY_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+def save_retry_rows(folder, skipped):
+    """Keep the retryable skipped rows for the next import"""
+    rows = [
+        {k: v for k, v in row.items() if k not in ("reason", "retryable")}
+        for row in skipped if row.get("retryable")
+    ]
+    path = os.path.join(folder, RETRY_FILE)
+    if rows:
+        write_atomic(path, dumps(rows))
+    elif os.path.exists(path):
+        os.remove(path)
+    return len(rows)
+
+def find_pending_files(folder, fingerprints):
+    """Report files in folder whose fingerprint is not in the cache"""
+    pending = []
+    if not os.path.isdir(folder):
+        return pending
+
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if not name.lower().endswith(REPORT_EXTENSIONS) or not os.path.isfile(path):
+            continue
+        fingerprint = file_fingerprint(path)
+        if fingerprint not in fingerprints:
+            pending.append((path, fingerprint))
+    return pending
+
+def merge_rows(row_lists):
+    """Merge parsed rows, keeping the first line seen for each order ID and ASIN"""
+    merged = []
+    seen = set()
+    duplicates = 0
+    for rows in row_lists:
+        for row in rows:
+            if row["order_id"]:
+                key = (row["order_id"], row["asin"])
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+            merged.append(row)
+    return merged, duplicates
+
+def ingest_folder(folder=None, max_workers=None):
+    """Parse all new report files in folder in parallel and merge the rows
+
+    Returns a dict with the merged rows (including rows left over from
+    earlier imports), per-file errors, the duplicate count and the
+    fingerprints to mark as imported once the batch is applied.
+    """
+    folder = folder or FILE_PATHS["uploads_folder"]
+    fingerprints = load_fingerprints(folder)
+    pending = find_pending_files(folder, fingerprints)
+    retry_rows = load_retry_rows(folder)
+
+    result = {"rows": [], "errors": {}, "duplicates": 0, "files": [], "fingerprints": {}, "retried": len(retry_rows)}
+    if not pending and not retry_rows:
+        return result
+
+    paths = [path for path, _ in pending]
+    if len(paths) <= 1:
+        parsed = [parse_report_file(path) for path in paths]
+    else:
+        # Forking the multi-threaded app server is unsafe, so workers are spawned
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            parsed = list(pool.map(parse_report_file, paths))
+
+    fingerprint_by_path = dict(pending)
+    row_lists = [retry_rows]
+    for path, rows, error in parsed:
+        name = os.path.basename(path)
+        if error:
+            result["errors"][name] = error
+            continue
+        row_lists.append(rows)
+        result["files"].append(name)
+        result["fingerprints"][fingerprint_by_path[path]] = {
+            "file": name,
+            "rows": len(rows),
+            "imported_at": datetime.datetime.now().isoformat()
+        }
+
+    result["rows"], result["duplicates"] = merge_rows(row_lists)
+    return result
+
+def apply_sales_batch(stock_data, packet_variations, rows, order_index=None):
+    """Deduct packed stock for sale rows; returns (applied, skipped)
+
+    Each applied entry is the row with parent_id and weight filled in, ready
+    to be recorded as a transaction. Rows whose order line is already in
+    order_index are skipped; skipped entries carry a reason and whether they
+    are worth retrying later.
+    """
+    parent_by_asin = {}
+    for parent_id, variations in packet_variations.items():
+        for asin in variations:
+            parent_by_asin[asin] = parent_id
+
+    applied = []
+    skipped = []
+    for row in rows:
+        duplicate_id = find_duplicate(order_index or {}, row["order_id"], row["asin"])
+        if duplicate_id is not None:
+            skipped.append(dict(row, reason=f"Already recorded ({duplicate_id})", retryable=False))
+            continue
+
+        parent_id = parent_by_asin.get(row["asin"])
+        if parent_id is None:
+            skipped.append(dict(row, reason="Unknown ASIN", retryable=True))
+            continue
+
+        packed = stock_data.setdefault(parent_id, {"loose_stock": 0, "packed_stock": {}}).setdefault("packed_stock", {})
+        available = packed.get(row["asin"], 0)
+        if available < row["quantity"]:
+            skipped.append(dict(row, reason=f"Insufficient stock (available {available})", retryable=True))
+            continue
+
+        packed[row["asin"]] = available - row["quantity"]
+        stock_data[parent_id]["last_updated"] = datetime.datetime.now().isoformat()
+        weight = row["quantity"] * packet_variations[parent_id][row["asin"]].get("weight", 0)
+        applied.append(dict(row, parent_id=parent_id, weight=weight))
+
+    return applied, skipped
@@ -0,0 +1,207 @@
+"""
+Per-location storage shards for the Stock Tracker application
+
+Each location (own warehouse, FBA fulfilment centres) keeps its stock
+and transactions in its own shard file, so a session only
+loads and writes the site it works at. The product catalog is shared, and
+every shard save also writes a small rollup of its stock totals; network
+wide views are built from those rollups without opening other shards.
+
+Transfers never write another location's shard, since a session working
+there would overwrite it with its in-memory copy. Instead they are posted
+to the destination's inbox, an append-only list of numbered entries. The
+owning session merges entries above its shard's inbox_seq watermark and
+saves; rollups count entries that have not been merged yet.
+"""
+
+import copy
+import datetime
+import os
+import threading
+from config import FILE_PATHS, LOCATIONS
+from storage import load_store, save_store
+
+def shards_folder():
+    """Folder holding the catalog, shard and rollup files"""
+    return FILE_PATHS["shards_folder"]
+
+def catalog_path():
+    """Shared product catalog (parent_items and packet_variations)"""
+    return os.path.join(shards_folder(), "catalog.json")
+
+def shard_path(location):
+    """Stock and transactions for one location"""
+    return os.path.join(shards_folder(), f"{location}.json")
+
+def rollup_path(location):
+    """Stock totals for one location"""
+    return os.path.join(shards_folder(), f"{location}.rollup.json")
+
+def order_index_path():
+    """Network-wide order line index"""
+    return os.path.join(shards_folder(), "order_index.json")
+
+def inbox_path(location):
+    """Transfers posted to a location that its shard may not include yet"""
+    return os.path.join(shards_folder(), f"{location}.inbox.json")
+
+_path_locks = {}
+_path_locks_lock = threading.Lock()
+
+def path_lock(path):
+    """Process-wide lock for read-modify-write of a shared file"""
+    with _path_locks_lock:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+def empty_shard(location, parent_items=None, packet_variations=None):
+    """Shard with a zeroed stock row for every catalog product"""
+    stock_data = {}
+    for parent_id in parent_items or {}:
+        stock_data[parent_id] = {
+            "loose_stock": 0,
+            "packed_stock": {asin: 0 for asin in (packet_variations or {}).get(parent_id, {})},
+            "opening_stock": 0,
+            "last_updated": datetime.datetime.now().isoformat()
+        }
+    return {
+        "location": location,
+        "stock_data": stock_data,
+        "transactions": [],
+        "daily_opening_stock": {},
+        "order_ids_backfilled": True,
+        "inbox_seq": 0
+    }
+
+def load_shard(location, parent_items=None, packet_variations=None):
+    """Load a location's shard, or an empty one if it has not been written yet"""
+    path = shard_path(location)
+    if not os.path.exists(path):
+        return empty_shard(location, parent_items, packet_variations)
+    return load_store(path)
+
+def compute_rollup(stock_data):
+    """Per-parent loose and packed totals for a shard's stock"""
+    return {
+        parent_id: {
+            "loose_stock": stock.get("loose_stock", 0),
+            "packed_stock": dict(stock.get("packed_stock", {})),
+            "last_updated": stock.get("last_updated", "")
+        }
+        for parent_id, stock in stock_data.items()
+    }
+
+def build_rollup(stock_data, inbox_seq=0):
+    """Rollup file content: stock totals and the last inbox entry they include"""
+    return {"inbox_seq": inbox_seq, "stock": compute_rollup(stock_data)}
+
+def load_rollups(locations=None):
+    """Rollups keyed by location, including transfers not yet merged by the owner
+
+    Locations with neither a rollup nor pending transfers are left out.
+    """
+    rollups = {}
+    for location in locations or LOCATIONS:
+        path = rollup_path(location)
+        rollup, inbox_seq = {}, 0
+        if os.path.exists(path):
+            data = load_store(path, validate=False)
+            if "stock" in data and "inbox_seq" in data:
+                rollup, inbox_seq = data["stock"], data["inbox_seq"]
+            else:
+                rollup = data
+
+        pending = [entry for entry in read_inbox(location) if entry["seq"] > inbox_seq]
+        if pending:
+            rollup = copy.deepcopy(rollup)
+            apply_transfer_entries(rollup, pending)
+        if rollup or os.path.exists(path):
+            rollups[location] = rollup
+    return rollups
+
+def aggregate_rollups(rollups):
+    """Combine rollups into a single stock_data map (same shape as a shard's)"""
+    combined = {}
+    for rollup in rollups.values():
+        for parent_id, stock in rollup.items():
+            total = combined.setdefault(parent_id, {"loose_stock": 0, "packed_stock": {}, "last_updated": ""})
+            total["loose_stock"] += stock.get("loose_stock", 0)
+            for asin, units in stock.get("packed_stock", {}).items():
+                total["packed_stock"][asin] = total["packed_stock"].get(asin, 0) + units
+            total["last_updated"] = max(total["last_updated"], stock.get("last_updated", ""))
+    return combined
+
+def migrate_legacy_file(legacy_path, location):
+    """Split a single-file store into the catalog and one location's shard
+
+    Returns True when a legacy file was migrated. The legacy file is left in
+    place as a backup.
+    """
+    if os.path.exists(catalog_path()) or not os.path.exists(legacy_path):
+        return False
+
+    data = load_store(legacy_path)
+    os.makedirs(shards_folder(), exist_ok=True)
+
+    shard = {
+        "location": location,
+        "stock_data": data.get("stock_data", {}),
+        "transactions": data.get("transactions", []),
+        "daily_opening_stock": data.get("daily_opening_stock", {}),
+        # Files without an order index only have order IDs in sale notes; the app backfills them on first load
+        "order_ids_backfilled": "order_index" in data,
+        "inbox_seq": 0
+    }
+    for transaction in shard["transactions"]:
+        transaction.setdefault("location", location)
+
+    save_store(shard_path(location), shard)
+    save_store(rollup_path(location), build_rollup(shard["stock_data"]))
+    save_store(catalog_path(), {
+        "parent_items": data.get("parent_items", {}),
+        "packet_variations": data.get("packet_variations", {})
+    })
+    return True
+
+def read_inbox(location):
+    """Transfer entries posted to a location, oldest first"""
+    path = inbox_path(location)
+    if not os.path.exists(path):
+        return []
+    return load_store(path, validate=False).get("entries", [])
+
+def post_transfer(location, entry):
+    """Append a transfer entry to a location's inbox and return its sequence number
+
+    Written synchronously, so the entry is on disk before the source deducts stock.
+    """
+    path = inbox_path(location)
+    with path_lock(path):
+        inbox = load_store(path, validate=False) if os.path.exists(path) else {"next_seq": 1, "entries": []}
+        entry = dict(entry, seq=inbox["next_seq"])
+        inbox["entries"].append(entry)
+        inbox["next_seq"] += 1
+        save_store(path, inbox)
+    return entry["seq"]
+
+def prune_inbox(location, applied_seq):
+    """Drop inbox entries already included in the location's saved shard"""
+    path = inbox_path(location)
+    with path_lock(path):
+        if not os.path.exists(path):
+            return
+        inbox = load_store(path, validate=False)
+        remaining = [entry for entry in inbox["entries"] if entry["seq"] > applied_seq]
+        if len(remaining) != len(inbox["entries"]):
+            inbox["entries"] = remaining
+            save_store(path, inbox)
+
+def apply_transfer_entries(stock_data, entries):
+    """Add the stock from inbox entries to a stock_data (or rollup) map"""
+    for entry in entries:
+        stock = stock_data.setdefault(entry["parent_id"], {"loose_stock": 0, "packed_stock": {}, "opening_stock": 0})
+        if entry.get("asin"):
+            packed = stock.setdefault("packed_stock", {})
+            packed[entry["asin"]] = packed.get(entry["asin"], 0) + entry["quantity"]
+        else:
+            stock["loose_stock"] = stock.get("loose_stock", 0) + entry["weight"]
+        stock["last_updated"] = datetime.datetime.now().isoformat()
@@ -0,0 +1,117 @@
+"""
+Order ID index for the Stock Tracker application
+
+Sales carry an order_id field, and a single network-wide index maps each
+order line (order ID + ASIN) to the location and transaction that recorded
+it, so duplicate sales are caught with a dict lookup instead of a scan of
+notes, whichever location the sale was recorded at.
+"""
+
+import os
+import re
+import threading
+from storage import load_store
+
+ORDER_NOTE_PATTERN = re.compile(r"Order:\s*([^|]+?)\s*(?:\||$)")
+
+def order_key(order_id, asin):
+    """Index key for one order line"""
+    return f"{str(order_id).strip()}|{asin or ''}"
+
+def extract_order_id(notes):
+    """Pull an order ID out of a '... | Order: <id> | ...' notes string"""
+    if not notes:
+        return None
+    match = ORDER_NOTE_PATTERN.search(str(notes))
+    return match.group(1) if match else None
+
+def transaction_ref(location, transaction_id):
+    """Index value naming the transaction that recorded an order line"""
+    return f"{location} #{transaction_id}"
+
+def backfill_order_ids(transactions):
+    """Set order_id on sales that only have it in their notes; returns the count"""
+    filled = 0
+    for transaction in transactions:
+        if transaction.get("order_id") or "Sale" not in transaction.get("type", ""):
+            continue
+        order_id = extract_order_id(transaction.get("notes"))
+        if order_id:
+            transaction["order_id"] = order_id
+            filled += 1
+    return filled
+
+def build_order_index(transactions):
+    """Build the order line -> transaction ID index from transactions"""
+    index = {}
+    for transaction in transactions:
+        if transaction.get("order_id"):
+            index.setdefault(order_key(transaction["order_id"], transaction.get("asin")), transaction.get("id"))
+    return index
+
+def find_duplicate(index, order_id, asin):
+    """What already recorded this order line (transaction ID or location reference), or None"""
+    if not order_id:
+        return None
+    return index.get(order_key(order_id, asin))
+
+class OrderIndex:
+    """Order line -> transaction reference index shared by every location
+
+    There is one instance per process. Hold lock across the duplicate check
+    and the recording of a sale, so two sessions cannot record the same
+    order line at different locations.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = load_store(self.path, validate=False) if os.path.exists(self.path) else {}
+        return self._entries
+
+    def get(self, key, default=None):
+        """Reference for an order_key, so find_duplicate works on this index"""
+        with self.lock:
+            return self._load().get(key, default)
+
+    def reserve(self, order_id, asin, reference):
+        """Record an order line; returns False if it was already recorded"""
+        with self.lock:
+            entries = self._load()
+            key = order_key(order_id, asin)
+            if key in entries:
+                return False
+            entries[key] = reference
+            return True
+
+    def merge(self, index, location):
+        """Add a location's order line -> transaction ID index; returns the count added"""
+        added = 0
+        with self.lock:
+            entries = self._load()
+            for key, transaction_id in index.items():
+                if key not in entries:
+                    entries[key] = transaction_ref(location, transaction_id)
+                    added += 1
+        return added
+
+    def to_dict(self):
+        """Copy of the index for saving"""
+        with self.lock:
+            return dict(self._load())
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_order_index(path):
+    """Return the process-wide order index stored at path"""
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = OrderIndex(path)
+            _indexes[path] = index
+        return index
@@ -0,0 +1,187 @@
+"""
+Write-behind persistence for the Stock Tracker application
+
+Form submits hand an encoded snapshot to a background thread instead of
+writing the data file themselves. Snapshots queued while a write is in
+progress are coalesced, so a burst of entries lands as one disk write.
+
+Each file has its own writer, so files reach disk in no fixed order unless
+a snapshot names the writers it depends on. Such a snapshot is written only
+after everything submitted to those writers before it has been written
+successfully, and it is dropped (recorded as last_error) if one of those
+writes failed. The app uses this so the shard lands before its rollup and
+before the order index entries for the sales in it; writes it makes
+outside these writers (report fingerprints) wait on flush() instead.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from storage import dumps, write_atomic
+
+class WriteBehindWriter:
+    """Background thread that persists the newest queued snapshot of a file"""
+
+    def __init__(self, path, max_queue=64):
+        self.path = path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Condition()
+        self._submit_lock = threading.Lock()
+        self._submitted_seq = 0
+        self._written_seq = 0
+        # Highest sequence number whose snapshot (or a newer one) is on disk
+        self._durable_seq = 0
+        self._closed = False
+        self.last_error = None
+        self.flush_count = 0
+        self.coalesced_count = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"write-behind:{path}", daemon=True)
+        self._thread.start()
+
+    def submit(self, data, after=()):
+        """Queue a snapshot of data for writing and return its sequence number
+
+        after lists writers whose snapshots submitted so far must be on disk
+        before this one is written. Dependencies must not form a cycle.
+        """
+        payload = dumps(data)
+        depends_on = {writer: writer.submitted_seq() for writer in after}
+        # Sequence numbers and queue order must agree for coalescing to be safe
+        with self._submit_lock:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Writer is closed")
+                self._submitted_seq += 1
+                seq = self._submitted_seq
+            # Blocks when the queue is full, which bounds memory held by snapshots
+            self._queue.put((seq, payload, depends_on, time.perf_counter()))
+        return seq
+
+    def submitted_seq(self):
+        """Sequence number of the newest submitted snapshot"""
+        with self._lock:
+            return self._submitted_seq
+
+    def wait_durable(self, seq, timeout=None):
+        """Wait until snapshot seq has been written; False if it (and every newer one) failed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._written_seq < seq and self._thread.is_alive():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return self._durable_seq >= seq
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            # Drain whatever else is queued and keep only the newest snapshot.
+            # Sequence numbers are assigned in submit order, so the newest
+            # snapshot supersedes every earlier one.
+            stop = False
+            skipped = 0
+            seq, payload, depends_on, queued_at = item
+            depends_on = dict(depends_on)
+            while True:
+                try:
+                    newer = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if newer is None:
+                    stop = True
+                    break
+                seq, payload, newer_depends_on, _ = newer
+                # The newest snapshot includes the older ones, so it inherits their dependencies
+                for writer, dep_seq in newer_depends_on.items():
+                    depends_on[writer] = max(depends_on.get(writer, 0), dep_seq)
+                skipped += 1
+
+            error = None
+            for writer, dep_seq in depends_on.items():
+                if not writer.wait_durable(dep_seq):
+                    error = RuntimeError(f"not written because {writer.path} was not written")
+                    break
+            if error is None:
+                try:
+                    write_atomic(self.path, payload)
+                except Exception as e:
+                    error = e
+
+            latency = time.perf_counter() - queued_at
+            with self._lock:
+                self.last_error = error
+                self.flush_count += 1
+                self.coalesced_count += skipped
+                self.last_flush_latency = latency
+                self.max_flush_latency = max(self.max_flush_latency, latency)
+                self._written_seq = seq
+                if error is None:
+                    self._durable_seq = seq
+                self._lock.notify_all()
+
+            if stop:
+                break
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is on disk; False on timeout or write error"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            target = self._submitted_seq
+            while self._written_seq < target and self._thread.is_alive():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return self._durable_seq >= target
+
+    def close(self, timeout=None):
+        """Flush pending writes and stop the worker thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def get_stats(self):
+        """Queue depth and flush latency figures"""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "pending_writes": self._submitted_seq - self._written_seq,
+                "flush_count": self.flush_count,
+                "coalesced_writes": self.coalesced_count,
+                "last_flush_latency_ms": self.last_flush_latency * 1000,
+                "max_flush_latency_ms": self.max_flush_latency * 1000,
+                "last_error": str(self.last_error) if self.last_error else None
+            }
+
+# One writer per data file, shared by every session in the process
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_writer(path):
+    """Return the process-wide writer for path, starting it if needed"""
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = WriteBehindWriter(path)
+            _writers[path] = writer
+        return writer
+
+def close_all_writers():
+    """Flush and stop every writer (registered to run at interpreter exit)"""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+atexit.register(close_all_writers)
@@ -0,0 +1,384 @@
+"""
+Google Sheets sync for the Stock Tracker application
+
+Only changes since the last successful sync are pushed: transactions newer
+than the watermark are written to the rows after the last synced one, and
+stock rows whose values changed are rewritten with batched range updates.
+Every write targets an explicit range, so retrying one is safe. Pushes run
+on a background thread with retry and exponential backoff. LocalSheetsBackend stores worksheets
+as JSON files so the sync can be exercised without Google credentials.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from config import FILE_PATHS, SHEETS_SYNC
+from storage import dumps, loads, write_atomic
+
+STOCK_SHEET = "Stock"
+TRANSACTIONS_SHEET = "Transactions"
+
+STOCK_COLUMNS = ["Parent ID", "Product", "ASIN", "Loose Stock (kg)", "Packed Units", "Last Updated"]
+TRANSACTION_COLUMNS = [
+    "id", "timestamp", "date", "type", "parent_id", "parent_name",
+    "asin", "quantity", "weight", "notes", "batch_id", "order_id",
+    "location", "transfer_id"
+]
+
+def column_letter(index):
+    """Convert a 1-based column index to A1 letters"""
+    letters = ""
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+def column_index(letters):
+    """Convert A1 column letters to a 1-based index"""
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index
+
+class SheetsBackend:
+    """Interface for the spreadsheet the sync writes to"""
+
+    def batch_update(self, worksheet, updates):
+        """Apply a list of {"range": "A2:F3", "values": [[...], ...]} updates in one call"""
+        raise NotImplementedError
+
+class GspreadBackend(SheetsBackend):
+    """Backend writing to a Google Sheet through gspread"""
+
+    def __init__(self, spreadsheet_key, credentials_file):
+        try:
+            import gspread
+        except ImportError:
+            raise ImportError("gspread is required for Google Sheets sync (see requirements.txt)")
+
+        client = gspread.service_account(filename=credentials_file)
+        self.spreadsheet = client.open_by_key(spreadsheet_key)
+        self._worksheets = {}
+
+    def _worksheet(self, name):
+        if name not in self._worksheets:
+            import gspread
+            try:
+                self._worksheets[name] = self.spreadsheet.worksheet(name)
+            except gspread.WorksheetNotFound:
+                self._worksheets[name] = self.spreadsheet.add_worksheet(name, rows=1000, cols=len(TRANSACTION_COLUMNS))
+        return self._worksheets[name]
+
+    def batch_update(self, worksheet, updates):
+        if not updates:
+            return
+        sheet = self._worksheet(worksheet)
+        # Writes outside the grid are rejected, so grow the sheet first
+        last_row = max(int(re.search(r"(\d+)$", update["range"]).group(1)) for update in updates)
+        if last_row > sheet.row_count:
+            sheet.add_rows(last_row - sheet.row_count)
+        sheet.batch_update(updates, value_input_option="RAW")
+
+class LocalSheetsBackend(SheetsBackend):
+    """Offline stand-in that keeps each worksheet as a JSON list of rows"""
+
+    _RANGE = re.compile(r"^([A-Z]+)(\d+):([A-Z]+)(\d+)$")
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.call_count = 0
+
+    def _path(self, worksheet):
+        return os.path.join(self.folder, f"{worksheet}.json")
+
+    def read_rows(self, worksheet):
+        """Return all rows of a worksheet"""
+        path = self._path(worksheet)
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            return loads(f.read())
+
+    def _write_rows(self, worksheet, rows):
+        write_atomic(self._path(worksheet), dumps(rows))
+
+    def batch_update(self, worksheet, updates):
+        self.call_count += 1
+        rows = self.read_rows(worksheet)
+        for update in updates:
+            match = self._RANGE.match(update["range"])
+            if not match:
+                raise ValueError(f"Unsupported range: {update['range']}")
+            first_col = column_index(match.group(1))
+            first_row = int(match.group(2))
+            for offset, values in enumerate(update["values"]):
+                row_index = first_row - 1 + offset
+                while len(rows) <= row_index:
+                    rows.append([])
+                row = rows[row_index]
+                while len(row) < first_col - 1 + len(values):
+                    row.append("")
+                row[first_col - 1:first_col - 1 + len(values)] = values
+        self._write_rows(worksheet, rows)
+
+def _cell(value):
+    """Sheets cells take scalars; None becomes an empty cell"""
+    return "" if value is None else value
+
+def _row_hash(values):
+    return hashlib.sha1(json.dumps(values, default=str).encode("utf-8")).hexdigest()
+
+def build_stock_rows(stock_data, parent_items):
+    """Flatten stock_data into keyed sheet rows: one loose row and one row per ASIN"""
+    rows = {}
+    for parent_id, stock in stock_data.items():
+        name = parent_items.get(parent_id, {}).get("name", parent_id)
+        updated = stock.get("last_updated", "")
+        rows[f"{parent_id}|"] = [parent_id, name, "", stock.get("loose_stock", 0), "", updated]
+        for asin, units in stock.get("packed_stock", {}).items():
+            rows[f"{parent_id}|{asin}"] = [parent_id, name, asin, "", units, updated]
+    return rows
+
+def _group_contiguous(row_updates, width):
+    """Merge {row_number: values} into range updates covering consecutive rows"""
+    updates = []
+    last_col = column_letter(width)
+    run_start = None
+    run_values = []
+    for row_number in sorted(row_updates):
+        if run_start is not None and row_number == run_start + len(run_values):
+            run_values.append(row_updates[row_number])
+            continue
+        if run_start is not None:
+            updates.append({"range": f"A{run_start}:{last_col}{run_start + len(run_values) - 1}", "values": run_values})
+        run_start = row_number
+        run_values = [row_updates[row_number]]
+    if run_start is not None:
+        updates.append({"range": f"A{run_start}:{last_col}{run_start + len(run_values) - 1}", "values": run_values})
+    return updates
+
+class SyncState:
+    """Watermark of what has already been pushed"""
+
+    def __init__(self, path):
+        self.path = path
+        self.last_transaction_id = 0
+        # Sheet row the next transaction is written to (row 1 is the header)
+        self.next_transaction_row = 2
+        self.headers_written = False
+        # Stock row key -> [sheet row number, hash of last pushed values]
+        self.stock_rows = {}
+        self.last_sync = None
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = loads(f.read())
+            self.last_transaction_id = data.get("last_transaction_id", 0)
+            # Transaction IDs are sequential, so older state files imply the row
+            self.next_transaction_row = data.get("next_transaction_row", 2 + self.last_transaction_id)
+            self.headers_written = data.get("headers_written", False)
+            self.stock_rows = data.get("stock_rows", {})
+            self.last_sync = data.get("last_sync")
+
+    def save(self):
+        write_atomic(self.path, dumps({
+            "last_transaction_id": self.last_transaction_id,
+            "next_transaction_row": self.next_transaction_row,
+            "headers_written": self.headers_written,
+            "stock_rows": self.stock_rows,
+            "last_sync": self.last_sync
+        }))
+
+def compute_delta(data, state):
+    """Work out which transactions and stock rows changed since the watermark"""
+    new_transactions = [
+        [_cell(t.get(column)) for column in TRANSACTION_COLUMNS]
+        for t in data.get("transactions", [])
+        if isinstance(t.get("id"), int) and t["id"] > state.last_transaction_id
+    ]
+    new_transactions.sort(key=lambda row: row[0])
+
+    stock_rows = build_stock_rows(data.get("stock_data", {}), data.get("parent_items", {}))
+    next_row = 2 + len(state.stock_rows)
+    changed_rows = {}
+    stock_marks = {}
+    for key, values in stock_rows.items():
+        row_hash = _row_hash(values)
+        known = state.stock_rows.get(key)
+        if known is None:
+            row_number = next_row
+            next_row += 1
+        elif known[1] != row_hash:
+            row_number = known[0]
+        else:
+            continue
+        changed_rows[row_number] = values
+        stock_marks[key] = [row_number, row_hash]
+
+    return {
+        "transactions": new_transactions,
+        "stock_updates": _group_contiguous(changed_rows, len(STOCK_COLUMNS)),
+        "stock_marks": stock_marks
+    }
+
+class SheetsSyncer:
+    """Background worker pushing deltas to a SheetsBackend
+
+    Pass either a backend or a backend_factory; a factory is called on the
+    worker thread, so connecting and authenticating never block the caller
+    and failures are reported through last_error.
+    """
+
+    def __init__(self, backend=None, state_path=None, batch_size=500, max_retries=5, backoff_seconds=1.0,
+                 sheet_suffix="", backend_factory=None):
+        self.backend = backend
+        self.backend_factory = backend_factory
+        self.stock_sheet = STOCK_SHEET + sheet_suffix
+        self.transactions_sheet = TRANSACTIONS_SHEET + sheet_suffix
+        self.state = SyncState(state_path)
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.last_error = None
+        self._pending = None
+        self._condition = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="sheets-sync", daemon=True)
+        self._thread.start()
+
+    def request_sync(self, data):
+        """Queue a sync of data; requests made while one is pending replace it"""
+        snapshot = {
+            "stock_data": copy.deepcopy(data.get("stock_data", {})),
+            "transactions": list(data.get("transactions", [])),
+            "parent_items": copy.deepcopy(data.get("parent_items", {}))
+        }
+        with self._condition:
+            self._pending = snapshot
+            self._condition.notify_all()
+
+    def _with_retry(self, func, *args):
+        delay = self.backoff_seconds
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                self.last_error = e
+                time.sleep(delay)
+                delay *= 2
+
+    def sync_now(self, data):
+        """Push the delta for data synchronously and advance the watermark"""
+        state = self.state
+        if self.backend is None:
+            self.backend = self._with_retry(self.backend_factory)
+        delta = compute_delta(data, state)
+
+        if not state.headers_written:
+            self._with_retry(self.backend.batch_update, self.stock_sheet,
+                             [{"range": f"A1:{column_letter(len(STOCK_COLUMNS))}1", "values": [STOCK_COLUMNS]}])
+            self._with_retry(self.backend.batch_update, self.transactions_sheet,
+                             [{"range": f"A1:{column_letter(len(TRANSACTION_COLUMNS))}1", "values": [TRANSACTION_COLUMNS]}])
+            state.headers_written = True
+            state.save()
+
+        # Watermark moves after each confirmed chunk so a failure never skips rows.
+        # Chunks go to explicit rows rather than an append, so a retry after a
+        # timed-out but applied write overwrites the same rows instead of duplicating them.
+        rows = delta["transactions"]
+        last_col = column_letter(len(TRANSACTION_COLUMNS))
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            first_row = state.next_transaction_row
+            self._with_retry(self.backend.batch_update, self.transactions_sheet, [
+                {"range": f"A{first_row}:{last_col}{first_row + len(chunk) - 1}", "values": chunk}
+            ])
+            state.last_transaction_id = chunk[-1][0]
+            state.next_transaction_row = first_row + len(chunk)
+            state.save()
+
+        if delta["stock_updates"]:
+            self._with_retry(self.backend.batch_update, self.stock_sheet, delta["stock_updates"])
+            state.stock_rows.update(delta["stock_marks"])
+
+        state.last_sync = time.strftime("%Y-%m-%dT%H:%M:%S")
+        state.save()
+        self.last_error = None
+        return len(rows), len(delta["stock_marks"])
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    break
+                data = self._pending
+                self._pending = None
+                self._busy = True
+            try:
+                self.sync_now(data)
+            except Exception as e:
+                self.last_error = e
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Wait until no sync is pending or running"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def close(self, timeout=None):
+        """Finish pending work and stop the worker"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+_backend = None
+_backend_lock = threading.Lock()
+_syncers = {}
+_syncer_lock = threading.Lock()
+
+def _shared_backend():
+    """Backend shared by all locations' syncers, built on first use"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if SHEETS_SYNC.get("spreadsheet_key"):
+                _backend = GspreadBackend(SHEETS_SYNC["spreadsheet_key"], SHEETS_SYNC["credentials_file"])
+            else:
+                _backend = LocalSheetsBackend(SHEETS_SYNC["local_folder"])
+        return _backend
+
+def get_syncer(location=None):
+    """Return the process-wide syncer for a location, built from SHEETS_SYNC settings
+
+    Each location syncs to its own pair of worksheets with its own watermark,
+    since transaction IDs are only unique within a location's shard.
+    """
+    with _syncer_lock:
+        if location not in _syncers:
+            state_path = FILE_PATHS["sync_state"]
+            if location:
+                root, ext = os.path.splitext(state_path)
+                state_path = f"{root}.{location}{ext}"
+
+            _syncers[location] = SheetsSyncer(
+                state_path=state_path,
+                backend_factory=_shared_backend,
+                batch_size=SHEETS_SYNC.get("batch_size", 500),
+                max_retries=SHEETS_SYNC.get("max_retries", 5),
+                backoff_seconds=SHEETS_SYNC.get("backoff_seconds", 1.0),
+                sheet_suffix=f" - {location}" if location else ""
+            )
+        return _syncers[location]
@@ -0,0 +1,116 @@
+"""
+Data file serialization for the Stock Tracker application
+
+Uses orjson or msgspec when installed and compact stdlib json otherwise.
+All codecs read the older pretty-printed files, and writes go through a
+temp file and rename so a crash mid-write never leaves a truncated store.
+"""
+
+import json
+import os
+import tempfile
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Exceptions raised by loads() on malformed input (msgspec's DecodeError is not a ValueError)
+DECODE_ERRORS = (ValueError, msgspec.DecodeError) if msgspec is not None else (ValueError,)
+
+# Top-level keys of the data file and the type each must have
+DATA_SCHEMA = {
+    "stock_data": dict,
+    "transactions": list,
+    "parent_items": dict,
+    "packet_variations": dict,
+    "daily_opening_stock": dict,
+    "order_index": dict
+}
+
+def get_codec_name():
+    """Name of the codec used for encoding"""
+    if orjson is not None:
+        return "orjson"
+    if msgspec is not None:
+        return "msgspec"
+    return "json"
+
+def dumps(data):
+    """Encode data to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    if msgspec is not None:
+        return msgspec.json.encode(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def loads(raw):
+    """Decode JSON bytes or text (compact or pretty-printed)"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    if msgspec is not None:
+        return msgspec.json.decode(raw)
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    return json.loads(raw)
+
+def validate_schema(data):
+    """Validate the top-level structure of a loaded data file"""
+    errors = []
+
+    if not isinstance(data, dict):
+        return False, ["Data file must contain a JSON object"]
+
+    for key, expected_type in DATA_SCHEMA.items():
+        if key in data and not isinstance(data[key], expected_type):
+            errors.append(f"'{key}' must be a {expected_type.__name__}")
+
+    stock_data = data.get("stock_data", {})
+    if isinstance(stock_data, dict):
+        for parent_id, stock in stock_data.items():
+            if not isinstance(stock, dict) or not isinstance(stock.get("packed_stock", {}), dict):
+                errors.append(f"Invalid stock entry for '{parent_id}'")
+
+    transactions = data.get("transactions", [])
+    if isinstance(transactions, list):
+        for index, transaction in enumerate(transactions):
+            if not isinstance(transaction, dict) or "type" not in transaction or "parent_id" not in transaction:
+                errors.append(f"Invalid transaction at position {index}")
+
+    return len(errors) == 0, errors
+
+def write_atomic(path, payload):
+    """Write bytes to path via a temp file in the same folder and rename"""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def save_store(path, data):
+    """Serialize data and write it atomically"""
+    write_atomic(path, dumps(data))
+
+def load_store(path, validate=True):
+    """Read and decode a data file, raising ValueError if validation fails"""
+    with open(path, "rb") as f:
+        data = loads(f.read())
+
+    if validate:
+        is_valid, errors = validate_schema(data)
+        if not is_valid:
+            raise ValueError("; ".join(errors))
+
+    return data
@@ -0,0 +1,120 @@
+import http.client
+import json
+import threading
+import pytest
+
+pytest.importorskip("pandas")
+
+import api
+import config
+from locations import build_rollup, catalog_path, rollup_path
+from storage import save_store
+
+CATALOG = {
+    "parent_items": {
+        "RICE": {"name": "Rice", "unit": "kg"},
+        "DAL_&_RICE": {"name": "Dal & Rice", "unit": "kg"}
+    },
+    "packet_variations": {
+        "RICE": {"A1": {"weight": 1, "description": "1kg Rice"}, "A5": {"weight": 5, "description": "5kg Rice"}},
+        "DAL_&_RICE": {}
+    }
+}
+
+def write_rollup(location, units):
+    save_store(rollup_path(location), build_rollup({"RICE": {"loose_stock": 10, "packed_stock": {"A1": units, "A5": 1}}}))
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setitem(config.FILE_PATHS, "shards_folder", str(tmp_path))
+    monkeypatch.setitem(config.API_SETTINGS, "refresh_interval", 0)
+    monkeypatch.setitem(config.API_SETTINGS, "max_batch_asins", 2)
+    save_store(catalog_path(), CATALOG)
+    write_rollup("WAREHOUSE", 4)
+    write_rollup("FBA_BLR8", 3)
+
+    server = api.create_server(port=0)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def request(server, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    payload = response.read()
+    conn.close()
+    return response, json.loads(payload) if payload else None
+
+def test_stock_lookup_and_etag_revalidation(server):
+    response, body = request(server, "GET", "/stock?asin=A1")
+    assert response.status == 200
+    assert body["items"]["A1"]["packed_units"] == 7
+    assert body["items"]["A1"]["by_location"] == {"WAREHOUSE": 4, "FBA_BLR8": 3}
+    etag = response.getheader("ETag")
+
+    response, body = request(server, "GET", "/stock?asin=A1", headers={"If-None-Match": etag})
+    assert response.status == 304
+    assert body is None
+
+    write_rollup("WAREHOUSE", 9)
+    response, body = request(server, "GET", "/stock?asin=A1", headers={"If-None-Match": etag})
+    assert response.status == 200
+    assert response.getheader("ETag") != etag
+    assert body["items"]["A1"]["packed_units"] == 12
+
+def test_percent_encoded_parent_id(server):
+    response, body = request(server, "GET", "/stock/parent/DAL_%26_RICE")
+    assert response.status == 200
+    assert body["name"] == "Dal & Rice"
+
+@pytest.mark.parametrize("path, status", [
+    ("/stock", 400),
+    ("/stock?asin=A1,A5,A9", 400),
+    ("/stock?asin=A1&location=NOWHERE", 404),
+    ("/alerts?threshold=nan", 400),
+    ("/alerts?threshold=abc", 400),
+    ("/stock/parent/GONE", 404),
+])
+def test_get_errors(server, path, status):
+    response, body = request(server, "GET", path)
+    assert response.status == status
+    assert "error" in body
+
+def test_post_batch(server):
+    response, body = request(server, "POST", "/stock/batch", json.dumps({"asins": ["A1", "A5"], "location": "FBA_BLR8"}))
+    assert response.status == 200
+    assert body["items"]["A1"]["packed_units"] == 3
+    assert body["items"]["A5"]["by_location"] == {"FBA_BLR8": 1}
+
+@pytest.mark.parametrize("body, status", [
+    (b"{bad", 400),
+    (b"[1, 2]", 400),
+    (b'{"location": 5, "asins": ["A1"]}', 400),
+    (b'{"location": "NOWHERE", "asins": ["A1"]}', 404),
+    (b'{"asins": "A1"}', 400),
+    (b'{"asins": ["A1", "A5", "A9"]}', 400),
+])
+def test_post_errors(server, body, status):
+    response, payload = request(server, "POST", "/stock/batch", body)
+    assert response.status == status
+    assert "error" in payload
+
+@pytest.mark.parametrize("length, status", [("-1", 400), ("abc", 400), (str(10 * 1024 * 1024), 413)])
+def test_post_rejects_bad_content_length_without_reading(server, length, status):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    conn.putrequest("POST", "/stock/batch")
+    conn.putheader("Content-Length", length)
+    conn.endheaders()
+    response = conn.getresponse()
+    assert response.status == status
+    conn.close()
+
+def test_response_cache_is_capped_by_size(server, monkeypatch):
+    monkeypatch.setattr(api, "MAX_CACHED_BYTES", 300)
+    for asin in ["A1", "A5", "A1,A5"]:
+        request(server, "GET", f"/stock?asin={asin}")
+    snapshot = server.RequestHandlerClass.store.snapshot()
+    assert 0 < snapshot.cached_bytes <= 300
+    assert snapshot.cached_bytes == sum(len(body) for body in snapshot.responses.values())
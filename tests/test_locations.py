@@ -0,0 +1,20 @@
+import config
+import locations
+
+def test_pending_transfers_count_until_owner_merges(tmp_path, monkeypatch):
+    monkeypatch.setitem(config.FILE_PATHS, "shards_folder", str(tmp_path))
+    locations.save_store(locations.rollup_path("FBA_BLR8"),
+                         locations.build_rollup({"P1": {"loose_stock": 5, "packed_stock": {"A1": 1}}}))
+
+    seq = locations.post_transfer("FBA_BLR8", {
+        "date": "2026-01-05", "parent_id": "P1", "asin": "A1",
+        "quantity": 3, "weight": 1.5, "transfer_id": "TRF-1"
+    })
+    assert locations.load_rollups(["FBA_BLR8"])["FBA_BLR8"]["P1"]["packed_stock"]["A1"] == 4
+
+    # Owner saved a shard that includes the entry, then pruned it
+    locations.save_store(locations.rollup_path("FBA_BLR8"),
+                         locations.build_rollup({"P1": {"loose_stock": 5, "packed_stock": {"A1": 4}}}, seq))
+    locations.prune_inbox("FBA_BLR8", seq)
+    assert locations.read_inbox("FBA_BLR8") == []
+    assert locations.load_rollups(["FBA_BLR8"])["FBA_BLR8"]["P1"]["packed_stock"]["A1"] == 4
@@ -0,0 +1,19 @@
+from order_index import OrderIndex, build_order_index, find_duplicate
+from storage import save_store
+
+def test_order_lines_are_shared_across_locations(tmp_path):
+    path = tmp_path / "order_index.json"
+    save_store(str(path), {"404-1|A1": "WAREHOUSE #3"})
+    index = OrderIndex(str(path))
+
+    assert find_duplicate(index, "404-1", "A1") == "WAREHOUSE #3"
+    assert not index.reserve("404-1", "A1", "FBA_BLR8 #1")
+    assert index.reserve("404-2", "A1", "FBA_BLR8 #1")
+
+    transactions = [{"id": 7, "order_id": "404-3", "asin": "A2"}, {"id": 8, "order_id": "404-2", "asin": "A1"}]
+    assert index.merge(build_order_index(transactions), "FBA_DEL4") == 1
+    assert index.to_dict() == {
+        "404-1|A1": "WAREHOUSE #3",
+        "404-2|A1": "FBA_BLR8 #1",
+        "404-3|A2": "FBA_DEL4 #7"
+    }
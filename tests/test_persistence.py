@@ -0,0 +1,86 @@
+import threading
+import pytest
+import persistence
+from persistence import WriteBehindWriter
+from storage import load_store
+
+def blocking_writes(monkeypatch):
+    """Hold every write until the returned event is set; returns (release, written paths)"""
+    release = threading.Event()
+    written = []
+    real_write = persistence.write_atomic
+
+    def write(path, payload):
+        release.wait(5)
+        written.append(path)
+        real_write(path, payload)
+
+    monkeypatch.setattr(persistence, "write_atomic", write)
+    return release, written
+
+def test_snapshots_queued_during_a_write_are_coalesced(tmp_path, monkeypatch):
+    release, written = blocking_writes(monkeypatch)
+    writer = WriteBehindWriter(str(tmp_path / "shard.json"))
+    for n in range(5):
+        writer.submit({"n": n})
+
+    release.set()
+    assert writer.flush(timeout=5)
+    assert load_store(writer.path, validate=False) == {"n": 4}
+    assert len(written) < 5
+    assert writer.get_stats()["coalesced_writes"] == 5 - len(written)
+    writer.close()
+
+def test_dependent_snapshot_waits_for_its_dependency(tmp_path, monkeypatch):
+    release, written = blocking_writes(monkeypatch)
+    shard = WriteBehindWriter(str(tmp_path / "shard.json"))
+    index = WriteBehindWriter(str(tmp_path / "order_index.json"))
+    shard.submit({"transactions": [1]})
+    index.submit({"404-1|A1": "WAREHOUSE #1"}, after=[shard])
+
+    release.set()
+    assert index.flush(timeout=5)
+    assert written == [shard.path, index.path]
+    shard.close()
+    index.close()
+
+def test_dependent_snapshot_is_dropped_when_its_dependency_fails(tmp_path, monkeypatch):
+    shard = WriteBehindWriter(str(tmp_path / "missing" / "shard.json"))
+    index = WriteBehindWriter(str(tmp_path / "order_index.json"))
+    shard.submit({"transactions": [1]})
+    index.submit({"404-1|A1": "WAREHOUSE #1"}, after=[shard])
+
+    assert not index.flush(timeout=5)
+    assert not (tmp_path / "order_index.json").exists()
+    assert "shard.json" in index.get_stats()["last_error"]
+    shard.close()
+    index.close()
+
+def test_flush_reports_a_failed_write_until_a_later_one_succeeds(tmp_path, monkeypatch):
+    writer = WriteBehindWriter(str(tmp_path / "shard.json"))
+
+    def fail(path, payload):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(persistence, "write_atomic", fail)
+    writer.submit({"n": 1})
+    assert not writer.flush(timeout=5)
+    assert writer.get_stats()["last_error"] == "disk full"
+
+    monkeypatch.undo()
+    writer.submit({"n": 2})
+    assert writer.flush(timeout=5)
+    assert writer.get_stats()["last_error"] is None
+    writer.close()
+
+def test_close_writes_pending_snapshots_and_rejects_new_ones(tmp_path, monkeypatch):
+    release, written = blocking_writes(monkeypatch)
+    writer = WriteBehindWriter(str(tmp_path / "shard.json"))
+    writer.submit({"n": 1})
+    writer.submit({"n": 2})
+
+    release.set()
+    writer.close(timeout=5)
+    assert load_store(writer.path, validate=False) == {"n": 2}
+    with pytest.raises(RuntimeError):
+        writer.submit({"n": 3})
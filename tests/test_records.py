@@ -0,0 +1,51 @@
+"""
+Round-trip tests for the compact record types
+"""
+
+import json
+import os
+from records import TransactionLog
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_data.json")
+
+def load_sample():
+    with open(SAMPLE_FILE) as f:
+        return json.load(f)
+
+def test_sample_transactions_round_trip():
+    data = load_sample()
+    log = TransactionLog.from_transactions(data["transactions"])
+    assert log.to_transactions() == data["transactions"]
+
+def test_irregular_transactions_round_trip():
+    transactions = [
+        # parent_name explicitly null while the catalog has a name
+        {"id": 1, "type": "Stock Inward", "parent_id": "RICE", "parent_name": None, "date": "2025-07-16"},
+        # integer date / timestamp that must not be read as encoded values
+        {"id": 2, "type": "Packing", "parent_id": "RICE", "parent_name": "Rice", "date": 20240101, "timestamp": 1700000000},
+        # renamed parent, unknown type, optional fields set to null and extra keys
+        {"id": 3, "type": "Direct Sale", "parent_id": "RICE", "parent_name": "Old Rice", "batch_id": None,
+         "order_id": "404-1", "location": "WAREHOUSE", "custom": [1, 2]},
+        # parent missing from the catalog, most keys absent
+        {"id": 4, "parent_id": "GONE"},
+        # non-ISO date string and timestamp with microseconds
+        {"id": 5, "type": "Return", "parent_id": "RICE", "parent_name": "Rice", "date": "2025-7-1",
+         "timestamp": "2025-07-16T10:00:00.123456", "quantity": 2, "weight": 1.5, "notes": "x"},
+        {"id": 6, "type": "Return", "parent_id": "RICE", "parent_name": "Rice", "date": True, "timestamp": None}
+    ]
+    log = TransactionLog.from_transactions(transactions)
+    assert log.to_transactions() == transactions
+    assert log[-2:] == transactions[-2:]
+    assert log[0] == transactions[0]
+    assert len(log) == len(transactions)
+
+def test_parent_name_not_stored_per_row():
+    data = load_sample()
+    log = TransactionLog.from_transactions(data["transactions"])
+    assert all(record.name_override is None for record in log.records)
+
+def test_catalog_rename_does_not_rewrite_history():
+    log = TransactionLog.from_transactions([{"id": 1, "type": "Stock Inward", "parent_id": "RICE", "parent_name": "Rice"}])
+    # Product re-added under a new name, then a new row recorded with it
+    log.append({"id": 2, "type": "Stock Inward", "parent_id": "RICE", "parent_name": "Rice New"})
+    assert [t["parent_name"] for t in log] == ["Rice", "Rice New"]
@@ -0,0 +1,128 @@
+import pytest
+from sheets_sync import (
+    LocalSheetsBackend, SheetsSyncer, SyncState, STOCK_COLUMNS, TRANSACTION_COLUMNS, compute_delta
+)
+
+PARENT_ITEMS = {"RICE": {"name": "Rice"}, "DAL": {"name": "Dal"}}
+
+def transactions(count, start=1):
+    return [{"id": n, "type": "FBA Sale", "parent_id": "RICE", "asin": "A1", "quantity": 1} for n in range(start, start + count)]
+
+def store(count=0, loose=10):
+    return {
+        "stock_data": {"RICE": {"loose_stock": loose, "packed_stock": {"A1": 5}, "last_updated": "2026-01-01T00:00:00"}},
+        "transactions": transactions(count),
+        "parent_items": PARENT_ITEMS
+    }
+
+class FlakyBackend(LocalSheetsBackend):
+    """Fails chosen batch_update calls, optionally after applying them (a timed-out write)"""
+
+    def __init__(self, folder, fail_calls=(), apply_before_failing=False):
+        super().__init__(folder)
+        self.fail_calls = set(fail_calls)
+        self.apply_before_failing = apply_before_failing
+
+    def batch_update(self, worksheet, updates):
+        if self.call_count + 1 in self.fail_calls:
+            self.fail_calls.discard(self.call_count + 1)
+            if self.apply_before_failing:
+                super().batch_update(worksheet, updates)
+            else:
+                self.call_count += 1
+            raise ConnectionError("write timed out")
+        super().batch_update(worksheet, updates)
+
+@pytest.fixture
+def make_syncer(tmp_path):
+    syncers = []
+
+    def make(backend=None, **kwargs):
+        backend = backend or LocalSheetsBackend(str(tmp_path / "sheets"))
+        syncer = SheetsSyncer(backend, str(tmp_path / "sync_state.json"), max_retries=0, backoff_seconds=0, **kwargs)
+        syncers.append(syncer)
+        return syncer
+
+    yield make
+    for syncer in syncers:
+        syncer.close()
+
+def transaction_ids(backend):
+    return [row[0] for row in backend.read_rows("Transactions")[1:]]
+
+def test_delta_only_includes_changes_since_the_watermark(tmp_path):
+    state = SyncState(str(tmp_path / "sync_state.json"))
+    delta = compute_delta(store(3), state)
+    assert [row[0] for row in delta["transactions"]] == [1, 2, 3]
+    assert sorted(delta["stock_marks"]) == ["RICE|", "RICE|A1"]
+
+    state.last_transaction_id = 3
+    state.stock_rows.update(delta["stock_marks"])
+    delta = compute_delta(store(5, loose=8), state)
+    assert [row[0] for row in delta["transactions"]] == [4, 5]
+    # Only the loose row changed
+    assert delta["stock_updates"] == [{"range": "A2:F2", "values": [["RICE", "Rice", "", 8, "", "2026-01-01T00:00:00"]]}]
+
+def test_transactions_are_written_in_chunks_to_explicit_rows(make_syncer):
+    syncer = make_syncer(batch_size=2)
+    assert syncer.sync_now(store(5)) == (5, 2)
+    assert syncer.backend.read_rows("Transactions")[0] == TRANSACTION_COLUMNS
+    assert transaction_ids(syncer.backend) == [1, 2, 3, 4, 5]
+    assert syncer.state.next_transaction_row == 7
+
+    # Headers, three transaction chunks, one stock update; nothing is resent next time
+    calls = syncer.backend.call_count
+    assert syncer.sync_now(store(5)) == (0, 0)
+    assert syncer.backend.call_count == calls
+
+def test_failed_chunk_does_not_move_the_watermark(make_syncer, tmp_path):
+    # Calls 1-2 write headers, 3 is the first chunk, 4 the second
+    backend = FlakyBackend(str(tmp_path / "sheets"), fail_calls={4})
+    syncer = make_syncer(backend, batch_size=2)
+    with pytest.raises(ConnectionError):
+        syncer.sync_now(store(5))
+    assert syncer.state.last_transaction_id == 2
+    assert syncer.state.next_transaction_row == 4
+
+    assert syncer.sync_now(store(5)) == (3, 2)
+    assert transaction_ids(backend) == [1, 2, 3, 4, 5]
+
+def test_retry_after_an_applied_but_failed_write_does_not_duplicate_rows(make_syncer, tmp_path):
+    backend = FlakyBackend(str(tmp_path / "sheets"), fail_calls={3}, apply_before_failing=True)
+    syncer = make_syncer(backend, batch_size=2)
+    with pytest.raises(ConnectionError):
+        syncer.sync_now(store(3))
+    syncer.sync_now(store(3))
+    assert transaction_ids(backend) == [1, 2, 3]
+
+def test_stock_rows_keep_their_sheet_row_when_order_changes(make_syncer):
+    syncer = make_syncer()
+    data = store()
+    syncer.sync_now(data)
+    rows_before = dict(syncer.state.stock_rows)
+
+    # DAL is new and RICE now comes after it; only DAL rows and the changed RICE row are written
+    data["stock_data"] = {
+        "DAL": {"loose_stock": 4, "packed_stock": {}, "last_updated": "2026-01-02T00:00:00"},
+        "RICE": dict(data["stock_data"]["RICE"], loose_stock=7)
+    }
+    assert syncer.sync_now(data) == (0, 2)
+    assert syncer.state.stock_rows["RICE|A1"] == rows_before["RICE|A1"]
+    assert syncer.state.stock_rows["RICE|"][0] == rows_before["RICE|"][0]
+    assert syncer.state.stock_rows["DAL|"][0] == 4
+
+    sheet = syncer.backend.read_rows("Stock")
+    assert sheet[0] == STOCK_COLUMNS
+    assert [row[0] for row in sheet[1:]] == ["RICE", "RICE", "DAL"]
+    assert sheet[1][3] == 7
+
+def test_older_state_file_resumes_after_the_last_synced_row(make_syncer, tmp_path):
+    state_path = tmp_path / "sync_state.json"
+    state_path.write_text('{"last_transaction_id": 3, "headers_written": true}')
+    syncer = make_syncer()
+    assert syncer.state.next_transaction_row == 5
+
+    syncer.sync_now(store(4))
+    sheet = syncer.backend.read_rows("Transactions")
+    assert len(sheet) == 5
+    assert sheet[4][0] == 4
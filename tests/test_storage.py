@@ -0,0 +1,56 @@
+import json
+import os
+import pytest
+import storage
+from storage import load_store, save_store, validate_schema, write_atomic
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_data.json")
+
+def test_validate_schema_accepts_sample_data():
+    with open(SAMPLE_FILE) as f:
+        assert validate_schema(json.load(f)) == (True, [])
+
+@pytest.mark.parametrize("data, error", [
+    ([], "Data file must contain a JSON object"),
+    ({"stock_data": []}, "'stock_data' must be a dict"),
+    ({"transactions": {}}, "'transactions' must be a list"),
+    ({"stock_data": {"RICE": {"packed_stock": []}}}, "Invalid stock entry for 'RICE'"),
+    ({"transactions": [{"type": "Packing"}]}, "Invalid transaction at position 0"),
+])
+def test_validate_schema_reports_errors(data, error):
+    is_valid, errors = validate_schema(data)
+    assert not is_valid
+    assert errors == [error]
+
+def test_load_store_raises_value_error_on_invalid_data(tmp_path):
+    path = tmp_path / "shard.json"
+    path.write_text('{"stock_data": [1, 2]}')
+    with pytest.raises(ValueError, match="stock_data"):
+        load_store(str(path))
+
+def test_reads_pretty_printed_files(tmp_path):
+    with open(SAMPLE_FILE) as f:
+        data = json.load(f)
+    path = tmp_path / "stock_data.json"
+    path.write_text(json.dumps(data, indent=2, ensure_ascii=False))
+    assert load_store(str(path)) == data
+
+def test_save_store_round_trip(tmp_path):
+    data = {"stock_data": {"RICE": {"loose_stock": 1.5, "packed_stock": {}}}, "transactions": [], "notes": "चावल"}
+    path = str(tmp_path / "shard.json")
+    save_store(path, data)
+    assert load_store(path) == data
+
+def test_write_atomic_keeps_old_file_and_removes_temp_on_failure(tmp_path, monkeypatch):
+    path = tmp_path / "shard.json"
+    path.write_bytes(b'{"old": true}')
+
+    def fail(src, dst):
+        raise OSError("rename failed")
+
+    monkeypatch.setattr(storage.os, "replace", fail)
+    with pytest.raises(OSError):
+        write_atomic(str(path), b'{"new": true}')
+
+    assert path.read_bytes() == b'{"old": true}'
+    assert os.listdir(tmp_path) == ["shard.json"]